@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Automatic background sync
+# Watches the cameras in the settings file and starts an incremental download when a camera comes online.
+# Cameras with interrupted downloads are watched even if auto sync is disabled, so the download is resumed
+# as soon as the camera is seen again.  If auto sync is enabled a new incremental download is started instead,
+# which lists the camera again so new files are also downloaded
+# Cameras are probed with a cheap TCP connection to their web server.  Probes are frequent just after a
+# camera appears or disappears (e.g. the vehicle has just docked) and slow down while nothing changes
+
+import asyncio
+import logging
+
+from app import settings
+
+logger = logging.getLogger("camera_downloader.autosync")
+
+# web server port of each camera type, used to check if the camera is online
+CAMERA_PORTS = {
+    'siyi': 82,
+    'xfrobot': 80
+}
+
+PROBE_TIMEOUT = 1.0         # seconds to wait for a camera to accept a connection
+PROBE_INTERVAL_MIN = 2.0    # seconds between probes just after a camera appears or disappears
+PROBE_INTERVAL_MAX = 60.0   # seconds between probes once nothing has changed for a while
+PROBE_BACKOFF = 1.5         # probe interval is multiplied by this after each probe with no change
+
+
+# check if a camera is online by connecting to its web server
+async def probe_camera(camera_type: str, ip: str) -> bool:
+    """Check if a camera is accepting connections
+
+    Args:
+        camera_type: camera type ("siyi" or "xfrobot")
+        ip: IP address of the camera
+
+    Returns:
+        True if the camera accepted a connection
+    """
+    port = CAMERA_PORTS.get(camera_type, 80)
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=PROBE_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+class AutoSync:
+    """Background service which starts a sync each time a configured camera comes online"""
+
+    def __init__(self, run_sync, run_resume):
+        """
+        Args:
+            run_sync: coroutine function called with (camera_type, ip) to run an incremental download
+            run_resume: coroutine function called with (camera_type, ip) to resume an interrupted download
+        """
+        self.run_sync = run_sync
+        self.run_resume = run_resume
+        self.enabled = False
+        self.resume_cameras = set()
+        self.task = None
+        self.sync_tasks = {}
+        self.online = {}
+        self.interval = PROBE_INTERVAL_MIN
+
+    @property
+    def running(self) -> bool:
+        """True if the background service is running"""
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        """Start syncing cameras as they come online"""
+        self.enabled = True
+        self.start_watching()
+
+    async def stop(self):
+        """Stop syncing cameras.  Syncs which have already started are allowed to finish and
+        cameras with interrupted downloads are still watched"""
+        self.enabled = False
+        if not self.resume_cameras:
+            await self.close()
+
+    async def close(self):
+        """Stop probing cameras, e.g. when the app shuts down"""
+        if self.running:
+            logger.info("Stopping auto sync")
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    def start_watching(self):
+        """Start probing cameras if not already running"""
+        if not self.running:
+            logger.info("Starting auto sync")
+            self.online = {}
+            self.interval = PROBE_INTERVAL_MIN
+            self.task = asyncio.create_task(self.watch())
+
+    def watch_camera(self, camera_type: str, ip: str, online: bool = None):
+        """Watch a camera with an interrupted download, resuming the download when the camera comes online
+
+        Args:
+            online: True if the camera is known to be online, so the download is only resumed once it has gone
+                offline and come back.  None to resume as soon as the camera is seen
+        """
+        self.resume_cameras.add((camera_type, ip))
+        self.start_watching()
+        if online is not None:
+            self.online[(camera_type, ip)] = online
+
+    def forget_camera(self, camera_type: str, ip: str):
+        """Stop watching a camera whose interrupted download has finished"""
+        self.resume_cameras.discard((camera_type, ip))
+
+    async def watch(self):
+        """Probe cameras until auto sync is disabled and no downloads are waiting to be resumed"""
+        while self.enabled or self.resume_cameras:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.exception(f"Error probing cameras: {str(e)}")
+            await asyncio.sleep(self.interval)
+        logger.info("Stopping auto sync")
+
+    async def probe_all(self):
+        """Probe every watched camera once and adjust the probe interval"""
+        cameras = sorted(self.resume_cameras)
+        if self.enabled:
+            cameras += [camera for camera in settings.get_cameras() if camera not in self.resume_cameras]
+        results = await asyncio.gather(*(probe_camera(camera_type, ip) for camera_type, ip in cameras))
+
+        changed = False
+        for camera, online in zip(cameras, results):
+            was_online = self.online.get(camera, False)
+            self.online[camera] = online
+            if online == was_online:
+                continue
+            changed = True
+            camera_type, ip = camera
+            if online:
+                logger.info(f"{camera_type} camera at {ip} is online")
+                self.start_sync(camera_type, ip)
+            else:
+                logger.info(f"{camera_type} camera at {ip} is offline")
+
+        # probe quickly after a change, then gradually back off
+        if changed:
+            self.interval = PROBE_INTERVAL_MIN
+        else:
+            self.interval = min(PROBE_INTERVAL_MAX, self.interval * PROBE_BACKOFF)
+
+    def start_sync(self, camera_type: str, ip: str):
+        """Start a sync, or resume a camera's interrupted download if auto sync is disabled, unless one is already running.
+        A sync supersedes the interrupted download, so a job which keeps failing can never stop new files being synced"""
+        camera = (camera_type, ip)
+        sync_task = self.sync_tasks.get(camera)
+        if sync_task is not None and not sync_task.done():
+            return
+        if self.enabled:
+            self.sync_tasks[camera] = asyncio.create_task(self.run_sync(camera_type, ip))
+        elif camera in self.resume_cameras:
+            self.sync_tasks[camera] = asyncio.create_task(self.run_resume(camera_type, ip))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+Content addressed catalog of downloaded files
+
+Each downloaded file is recorded with its SHA-256 hash.  A file with the same content as an earlier download
+is replaced with a hardlink to it, so disk usage only grows with unique content.  No other copies are kept, so
+deleting every downloaded file with the same content (even outside the app) frees its disk space.
+The catalog is stored in a hidden directory inside the downloads directory
+
+Files deleted to free up space (or by the user) are remembered so incremental syncs do not download them again
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("camera_downloader.catalog")
+
+# catalog directory name, relative to the downloads directory
+CATALOG_DIRNAME = ".catalog"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# suffix of the temporary hardlink created while a duplicate file is replaced
+LINK_SUFFIX = ".link"
+
+
+# calculate the SHA-256 hash of a file
+def hash_file(path):
+    """
+    Calculate the SHA-256 hash of a file
+
+    Args:
+        path (str): path to the file
+
+    Returns:
+        str: hex digest of the file's contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Catalog:
+    """Catalog of downloaded files, deduplicated by content hash"""
+
+    def __init__(self, root_dir):
+        """
+        Args:
+            root_dir (str): downloads directory.  Catalogued paths are stored relative to this directory
+        """
+        self.root_dir = os.path.abspath(root_dir)
+        self.catalog_dir = os.path.join(self.root_dir, CATALOG_DIRNAME)
+        os.makedirs(self.catalog_dir, exist_ok=True)
+
+        # connection is shared between download threads, access is serialised by the lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(self.catalog_dir, "catalog.db"), timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+                                   path TEXT PRIMARY KEY,
+                                   hash TEXT NOT NULL,
+                                   size INTEGER NOT NULL,
+                                   added REAL NOT NULL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS files_hash ON files(hash)")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS removed (
+                                   path TEXT PRIMARY KEY,
+                                   removed REAL NOT NULL)""")
+
+    def close(self):
+        """Close the catalog database"""
+        with self.lock:
+            self.db.close()
+
+    def relpath(self, path):
+        """Convert an absolute path to the path stored in the catalog"""
+        return os.path.relpath(os.path.abspath(path), self.root_dir).replace(os.sep, "/")
+
+    def add(self, path, file_hash=None):
+        """
+        Add a downloaded file to the catalog.  If identical content has already been downloaded
+        the file is replaced with a hardlink to the earlier download
+
+        Args:
+            path (str): path to the downloaded file
+            file_hash (str): SHA-256 hash of the file, calculated if not provided
+
+        Returns:
+            bool: True if the file was a duplicate of content already in the catalog
+        """
+        if file_hash is None:
+            file_hash = hash_file(path)
+
+        duplicate = False
+        size = os.path.getsize(path)
+        for existing_path in self.lookup(file_hash):
+            try:
+                if os.path.samefile(existing_path, path):
+                    continue
+                # skip earlier downloads which have been modified since they were catalogued
+                if os.path.getsize(existing_path) != size:
+                    continue
+                temp_path = path + LINK_SUFFIX
+                os.link(existing_path, temp_path)
+                os.replace(temp_path, path)
+                duplicate = True
+                break
+            except FileNotFoundError:
+                # earlier download has been deleted outside the app
+                continue
+            except OSError as e:
+                # filesystem does not support hardlinks, keep the file but skip deduplication
+                logger.warning(f"Could not link {path} to {existing_path}: {e}")
+                break
+
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO files (path, hash, size, added) VALUES (?, ?, ?, ?)",
+                            (self.relpath(path), file_hash, size, time.time()))
+            self.db.execute("DELETE FROM removed WHERE path = ?", (self.relpath(path),))
+        return duplicate
+
+    def get_hash(self, path):
+        """Get the hash of a catalogued file, or None if the file is not in the catalog"""
+        with self.lock:
+            row = self.db.execute("SELECT hash FROM files WHERE path = ?", (self.relpath(path),)).fetchone()
+        return row[0] if row else None
+
+    def get_added(self, path):
+        """Get the time a file was added to the catalog, or None if the file is not in the catalog"""
+        with self.lock:
+            row = self.db.execute("SELECT added FROM files WHERE path = ?", (self.relpath(path),)).fetchone()
+        return row[0] if row else None
+
+    def lookup(self, file_hash):
+        """
+        Look up files by content hash
+
+        Args:
+            file_hash (str): SHA-256 hash of the content
+
+        Returns:
+            list: absolute paths of the downloaded files with this content
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT path FROM files WHERE hash = ? ORDER BY path", (file_hash,)).fetchall()
+        return [os.path.join(self.root_dir, row[0]) for row in rows]
+
+    def is_removed(self, path):
+        """Check if a file was downloaded but has since been deleted"""
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM removed WHERE path = ?", (self.relpath(path),)).fetchone()
+        return row is not None
+
+    def remove(self, path, remember=True):
+        """
+        Delete a downloaded file and remove it from the catalog.  Disk space is only freed once
+        no other downloaded files link to the same content
+
+        Args:
+            path (str): path to the downloaded file
+            remember (bool): remember the file was deleted so incremental syncs skip it
+
+        Returns:
+            int: number of bytes of disk space freed
+        """
+        freed = 0
+        if os.path.lexists(path):
+            st = os.lstat(path)
+            os.remove(path)
+            if st.st_nlink == 1:
+                freed = st.st_size
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM files WHERE path = ?", (self.relpath(path),))
+            if remember:
+                self.db.execute("INSERT OR REPLACE INTO removed (path, removed) VALUES (?, ?)",
+                                (self.relpath(path), time.time()))
+        return freed
+
+    def prune(self):
+        """
+        Remove catalogued files which have been deleted outside the app (e.g. with the BlueOS file browser)
+
+        Returns:
+            int: number of files removed from the catalog
+        """
+        with self.lock:
+            paths = [row[0] for row in self.db.execute("SELECT path FROM files")]
+        missing = [(path,) for path in paths if not os.path.lexists(os.path.join(self.root_dir, path))]
+        if missing:
+            with self.lock, self.db:
+                self.db.executemany("DELETE FROM files WHERE path = ?", missing)
+        return len(missing)
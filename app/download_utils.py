@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""
+Download helpers shared by the camera download scripts
+
+- connect, read and stall timeouts on every request to the camera
+- retries with jittered exponential backoff
+- per camera circuit breaker which lowers download concurrency as errors rise
+- retry queue for files which fail, retried once more at the end of the job
+- optionally skip files which have already been downloaded (incremental sync)
+- local directory layout which mirrors the camera's directories, optionally grouped by camera
+- optional content hash catalog which hardlinks identical files so they only use disk space once
+- minimum free disk space, files are not downloaded if free space falls below it
+- optional job journal recording the listing and downloaded files so interrupted jobs can be resumed
+"""
+
+import hashlib
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+
+# timeouts (in seconds)
+CONNECT_TIMEOUT = 5         # time allowed to connect to the camera
+READ_TIMEOUT = 20           # time allowed for any single read from the camera
+STALL_TIMEOUT = 60          # transfer is abandoned if less than STALL_MIN_BYTES arrive within this time
+STALL_MIN_BYTES = 16 * 1024
+PROGRESS_INTERVAL = 30      # progress of a large file is printed this often, so the app knows the script is working
+
+# retry and backoff settings
+RETRY_ATTEMPTS = 4          # attempts per request before the file is moved to the retry queue
+BACKOFF_BASE = 1.0          # first backoff delay (in seconds), doubled on every attempt
+BACKOFF_MAX = 30.0          # maximum backoff delay (in seconds)
+
+# circuit breaker settings
+MAX_CONCURRENCY = 3         # maximum number of simultaneous downloads from one camera
+FAILURE_THRESHOLD = 5       # consecutive failures before the circuit opens
+BREAKER_COOLDOWN = 30.0     # time (in seconds) the circuit stays open before requests are tried again
+
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+
+
+# get the local path for a file, mirroring the directory it is stored in on the camera
+# if camera_type and ip_address are provided files are grouped in a directory for each camera
+# empty, "." and ".." path components are dropped so files can never be written outside dest_dir
+def local_path(dest_dir, remote_dir, filename, camera_type=None, ip_address=None):
+    parts = [dest_dir]
+    if camera_type is not None and ip_address is not None:
+        parts += [camera_type, ip_address]
+    parts += [part for part in remote_dir.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    parts.append(os.path.basename(filename))
+    return os.path.join(*parts)
+
+
+# raised when a transfer stops making progress
+class StallError(Exception):
+    pass
+
+
+# abandons a transfer which stops making progress by closing its response from a background thread.
+# a camera trickling data can keep every read inside READ_TIMEOUT, so the download thread cannot check this itself
+class StallWatchdog:
+    def __init__(self, response):
+        self.response = response
+        self.window_bytes = 0
+        self.stalled = False
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    # record bytes received
+    def progress(self, num_bytes):
+        with self.lock:
+            self.window_bytes += num_bytes
+
+    # check progress every STALL_TIMEOUT seconds until stopped
+    def watch(self):
+        while not self.finished.wait(STALL_TIMEOUT):
+            with self.lock:
+                window_bytes = self.window_bytes
+                self.window_bytes = 0
+            if window_bytes < STALL_MIN_BYTES:
+                self.stalled = True
+                self.abort()
+                return
+
+    # shut down the socket so a read blocked in the download thread returns immediately
+    def abort(self):
+        connection = getattr(self.response.raw, "connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.response.close()
+
+    # stop watching, called once the transfer has finished
+    def stop(self):
+        self.finished.set()
+
+
+# calculate backoff delay for the given attempt number using "full jitter"
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# returns True if the exception is worth retrying
+def is_retryable(e):
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, StallError))
+
+
+# circuit breaker for a single camera
+# halves the allowed concurrency on each failure and opens after FAILURE_THRESHOLD consecutive failures.
+# concurrency is slowly increased again as requests succeed
+class CircuitBreaker:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    # record a successful request
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.successes += 1
+            if self.concurrency < self.max_concurrency and self.successes >= self.concurrency * 2:
+                self.concurrency += 1
+                self.successes = 0
+
+    # record a failed request.  returns True if this failure opened the circuit
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.successes = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN
+                return True
+            return False
+
+    # block until the circuit is closed (or half-open after the cooldown)
+    def wait_until_closed(self):
+        while True:
+            with self.lock:
+                remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+
+# downloads files from a single camera
+class Downloader:
+    def __init__(self, prefix_str, max_concurrency=MAX_CONCURRENCY, skip_existing=False, catalog=None, min_free_bytes=0,
+                 journal=None):
+        self.prefix_str = prefix_str
+        self.skip_existing = skip_existing
+        self.catalog = catalog
+        self.min_free_bytes = min_free_bytes
+        self.journal = journal
+        self.committed = journal.committed_paths(catalog) if journal is not None else set()
+        self.breaker = CircuitBreaker(max_concurrency)
+        self.retry_queue = []
+        self.session = requests.Session()
+
+    # print output to user.  flushed so progress reaches the web page immediately
+    def log(self, message):
+        print(self.prefix_str + message, flush=True)
+
+    # call func, retrying with backoff on errors which may be temporary
+    # raises the last exception if all attempts fail
+    def with_retries(self, description, func):
+        for attempt in range(RETRY_ATTEMPTS):
+            self.breaker.wait_until_closed()
+            try:
+                result = func()
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                # errors such as "404 not found" do not indicate a struggling camera
+                if not is_retryable(e):
+                    raise
+                if self.breaker.record_failure():
+                    self.log(f"too many errors, pausing requests for {BREAKER_COOLDOWN:.0f}s")
+                if attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                delay = backoff_delay(attempt)
+                self.log(f"{description} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    # send GET request and return the response after checking the status
+    def get(self, url, stream=False):
+        response = self.session.get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+        response.raise_for_status()
+        return response
+
+    # fetch url and return the decoded JSON response
+    def fetch_json(self, url):
+        return self.with_retries(f"request to {url}", lambda: self.get(url).json())
+
+    # fetch url and return the response text
+    def fetch_text(self, url):
+        return self.with_retries(f"request to {url}", lambda: self.get(url).text)
+
+    # download a single file to dest_path, raises StallError if the transfer stops making progress
+    # data is written to a temporary file which is renamed once complete so partial files are never left behind
+    # progress is printed every PROGRESS_INTERVAL seconds
+    # returns the SHA-256 hash of the file, calculated as it is downloaded
+    def _download_once(self, url, dest_path):
+        partial_path = dest_path + PARTIAL_SUFFIX
+        digest = hashlib.sha256()
+        try:
+            with self.get(url, stream=True) as response, open(partial_path, "wb") as f:
+                watchdog = StallWatchdog(response)
+                received = 0
+                last_progress = time.monotonic()
+                try:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        watchdog.progress(len(chunk))
+                        received += len(chunk)
+                        if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                            self.log(f"{os.path.basename(dest_path)}: {received / 2**20:.1f} MB received")
+                            last_progress = time.monotonic()
+                except Exception:
+                    if not watchdog.stalled:
+                        raise
+                finally:
+                    watchdog.stop()
+                # the watchdog may close the response between reads, ending the transfer early
+                if watchdog.stalled:
+                    raise StallError(f"less than {STALL_MIN_BYTES} bytes received in {STALL_TIMEOUT}s")
+            os.replace(partial_path, dest_path)
+            return digest.hexdigest()
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    # download a single file with retries
+    # returns True on success, False if the file was added to the retry queue
+    def download_file(self, url, dest_path):
+        filename = os.path.basename(dest_path)
+        self.log(f"downloading {filename} from {url}")
+        try:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            free_bytes = shutil.disk_usage(os.path.dirname(dest_path)).free
+            if free_bytes < self.min_free_bytes:
+                raise OSError(f"only {free_bytes // 2**20} MB of disk space free")
+            file_hash = self.with_retries(f"download of {filename}", lambda: self._download_once(url, dest_path))
+            if self.catalog is not None and self.catalog.add(dest_path, file_hash):
+                self.log(f"{filename} is identical to an earlier download, sharing disk space")
+            if self.journal is not None:
+                self.journal.commit(dest_path)
+            return True
+        except Exception as e:
+            self.log(f"failed to download {filename}: {e}")
+            return False
+
+    # download a list of (url, dest_path) pairs
+    # the number of simultaneous downloads follows the circuit breaker's concurrency
+    # returns the list of pairs which failed
+    def _download_list(self, files, max_concurrency):
+        pending = deque(files)
+        failed = []
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while pending or in_flight:
+                limit = min(max_concurrency, self.breaker.concurrency)
+                while pending and len(in_flight) < limit:
+                    url, dest_path = pending.popleft()
+                    in_flight[executor.submit(self.download_file, url, dest_path)] = (url, dest_path)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file = in_flight.pop(future)
+                    if not future.result():
+                        failed.append(file)
+        return failed
+
+    # record the complete list of (url, dest_path) pairs on the camera in the job journal
+    # an interrupted job resumes from this snapshot instead of listing the camera again
+    def record_listing(self, files):
+        if self.journal is not None:
+            self.journal.record_listing(files)
+            self.journal.mark_listing_complete()
+
+    # returns the listing snapshot of an interrupted job, or None if the camera must be listed
+    def resume_listing(self):
+        if self.journal is None or not self.journal.listing_complete:
+            return None
+        return self.journal.get_listing()
+
+    # returns True if the file has already been downloaded, including files since deleted to free up space
+    def already_downloaded(self, dest_path):
+        if os.path.exists(dest_path):
+            return True
+        return self.catalog is not None and self.catalog.is_removed(dest_path)
+
+    # download a list of (url, dest_path) pairs, failures are added to the retry queue for the end of the job
+    # returns the number of successfully downloaded files
+    def download_all(self, files):
+        # skip files this job downloaded before it was interrupted
+        if self.journal is not None:
+            new_files = [(url, dest_path) for url, dest_path in files if dest_path not in self.committed]
+            if len(new_files) < len(files):
+                self.log(f"resuming, skipping {len(files) - len(new_files)} file(s) downloaded before the interruption")
+            files = new_files
+        if self.skip_existing:
+            new_files = [(url, dest_path) for url, dest_path in files if not self.already_downloaded(dest_path)]
+            if len(new_files) < len(files):
+                self.log(f"skipping {len(files) - len(new_files)} file(s) already downloaded")
+            files = new_files
+        failed = self._download_list(files, self.breaker.max_concurrency)
+        self.retry_queue.extend(failed)
+        return len(files) - len(failed)
+
+    # retry all files in the retry queue one at a time.  should be called at the end of the job
+    # returns the list of (url, dest_path) pairs which still failed
+    def retry_failed(self):
+        if self.journal is not None:
+            self.journal.flush()
+        if not self.retry_queue:
+            return []
+        self.log(f"retrying {len(self.retry_queue)} failed file(s)")
+        failed = self._download_list(self.retry_queue, 1)
+        self.retry_queue = []
+        for url, dest_path in failed:
+            self.log(f"gave up downloading {os.path.basename(dest_path)} from {url}")
+        if self.journal is not None:
+            self.journal.flush()
+        return failed
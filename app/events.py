@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Progress event streams for download jobs
+# - Messages published by a job are fanned out to any number of listeners (e.g. several browser tabs)
+# - Messages are batched into a single SSE frame every BATCH_INTERVAL seconds
+# - Each listener has a bounded buffer.  If a slow listener falls behind the oldest messages
+#   are dropped and replaced with a summary of how many were skipped
+# - Heartbeats are sent to listeners when no messages have been published for a while
+
+import asyncio
+from collections import deque
+
+BATCH_INTERVAL = 0.25           # seconds messages are collected for before a frame is sent
+HEARTBEAT_INTERVAL = 5          # seconds without messages before a heartbeat is sent
+MAX_BUFFERED_MESSAGES = 200     # messages buffered for each listener before the oldest are dropped
+HISTORY_LENGTH = 20             # recent messages sent to listeners which join a job in progress
+
+# SSE comment, used as a heartbeat to keep the connection alive
+HEARTBEAT_FRAME = ":\n\n"
+
+
+class Listener:
+    """Messages waiting to be sent to a single listener"""
+
+    def __init__(self, backlog):
+        self.messages = deque(backlog, maxlen=MAX_BUFFERED_MESSAGES)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        if self.messages:
+            self.ready.set()
+
+    def add(self, message: str):
+        """Add a message, dropping the oldest message if the buffer is full"""
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.messages.append(message)
+        self.ready.set()
+
+    def take_frame(self) -> str:
+        """Remove all waiting messages and return them as a single SSE frame ("" if there are none)"""
+        lines = []
+        if self.dropped:
+            lines.append(f"... {self.dropped} messages skipped ...")
+            self.dropped = 0
+        lines.extend(self.messages)
+        self.messages.clear()
+        self.ready.clear()
+        if not lines:
+            return ""
+        # multi-line messages need each line prefixed with "data: "
+        return "".join(f"data: {line}\n" for message in lines for line in message.splitlines()) + "\n"
+
+
+class EventStream:
+    """Progress messages from one job, fanned out to any number of listeners"""
+
+    def __init__(self):
+        self.listeners = set()
+        self.history = deque(maxlen=HISTORY_LENGTH)
+        self.closed = False
+        self.done = asyncio.Event()
+
+    def publish(self, message: str):
+        """Send a message to all listeners.  Never blocks"""
+        self.history.append(message)
+        for listener in self.listeners:
+            listener.add(message)
+
+    def close(self):
+        """Mark the job as finished.  Listeners end once they have received all messages"""
+        self.closed = True
+        for listener in self.listeners:
+            listener.ready.set()
+        self.done.set()
+
+    async def wait_closed(self):
+        """Wait until the job has finished"""
+        await self.done.wait()
+
+    async def subscribe(self):
+        """Async generator of SSE frames for a new listener, starting with the most recent messages"""
+        listener = Listener(self.history)
+        self.listeners.add(listener)
+        try:
+            while not (self.closed and not listener.messages):
+                try:
+                    await asyncio.wait_for(listener.ready.wait(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_FRAME
+                    continue
+
+                # wait for more messages so they are sent together
+                if not self.closed:
+                    await asyncio.sleep(BATCH_INTERVAL)
+
+                frame = listener.take_frame()
+                if frame:
+                    yield frame
+
+            # Final heartbeat before closing
+            yield HEARTBEAT_FRAME
+        finally:
+            self.listeners.discard(listener)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""
+Durable journal of download jobs
+
+Records each job's parameters, a snapshot of the files listed on the camera and which files have been
+downloaded, so a job interrupted by a restart can be resumed from where it stopped.  The journal is a
+SQLite database in WAL mode shared by the web app (which creates and finishes jobs) and the download
+scripts (which record the listing and downloaded files).  Downloaded files are checkpointed in batches
+so journaling does not slow down downloads of many small files
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# downloaded files are written to the journal after this many files or seconds, whichever comes first
+CHECKPOINT_BATCH = 50
+CHECKPOINT_INTERVAL = 5.0
+
+# number of finished jobs kept in the journal
+MAX_FINISHED_JOBS = 50
+
+
+# open the journal database, creating the tables if required
+def connect(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    with db:
+        db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                          id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          camera_type TEXT NOT NULL,
+                          ip TEXT NOT NULL,
+                          params TEXT NOT NULL,
+                          status TEXT NOT NULL,
+                          listing_complete INTEGER NOT NULL DEFAULT 0,
+                          created REAL NOT NULL,
+                          updated REAL NOT NULL)""")
+        db.execute("""CREATE TABLE IF NOT EXISTS listing (
+                          job_id INTEGER NOT NULL,
+                          dest_path TEXT NOT NULL,
+                          url TEXT NOT NULL,
+                          PRIMARY KEY (job_id, dest_path))""")
+        db.execute("""CREATE TABLE IF NOT EXISTS committed (
+                          job_id INTEGER NOT NULL,
+                          dest_path TEXT NOT NULL,
+                          PRIMARY KEY (job_id, dest_path))""")
+    return db
+
+
+class Journal:
+    """Job journal used by the web app to create, finish and resume jobs"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): path to the journal database
+        """
+        self.path = str(path)
+
+        # connection is shared between the app's worker threads, access is serialised by the lock
+        self.lock = threading.Lock()
+        self.db = connect(self.path)
+
+    def create_job(self, camera_type, ip, params):
+        """
+        Record a new job.  Any other unfinished job for the same camera is marked as superseded
+
+        Args:
+            camera_type (str): camera type ("siyi" or "xfrobot")
+            ip (str): IP address of the camera
+            params (dict): download parameters, passed back when the job is resumed
+
+        Returns:
+            int: the new job's id
+        """
+        now = time.time()
+        with self.lock, self.db:
+            superseded = [(row[0],) for row in self.db.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND camera_type = ? AND ip = ?", (camera_type, ip))]
+            self.db.executemany("UPDATE jobs SET status = 'superseded', updated = ? WHERE id = ?",
+                                [(now, job_id) for job_id, in superseded])
+            self.db.executemany("DELETE FROM listing WHERE job_id = ?", superseded)
+            self.db.executemany("DELETE FROM committed WHERE job_id = ?", superseded)
+            cursor = self.db.execute("""INSERT INTO jobs (camera_type, ip, params, status, created, updated)
+                                        VALUES (?, ?, ?, 'running', ?, ?)""",
+                                     (camera_type, ip, json.dumps(params), now, now))
+        self.prune()
+        return cursor.lastrowid
+
+    def finish_job(self, job_id, status):
+        """
+        Mark a job as finished.  Its listing and downloaded files are no longer needed and are deleted
+
+        Args:
+            job_id (int): job id
+            status (str): "completed", "superseded" or "failed" (the job can never succeed, e.g. no file types selected)
+        """
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ?", (status, time.time(), job_id))
+            self.db.execute("DELETE FROM listing WHERE job_id = ?", (job_id,))
+            self.db.execute("DELETE FROM committed WHERE job_id = ?", (job_id,))
+
+    def get_status(self, job_id):
+        """Get a job's status, or None if the job is not found"""
+        with self.lock:
+            row = self.db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def unfinished_jobs(self):
+        """
+        Get jobs which were interrupted before they finished, oldest first
+
+        Returns:
+            list: dictionaries with id, camera_type, ip and params
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT id, camera_type, ip, params FROM jobs WHERE status = 'running' ORDER BY id"
+                                   ).fetchall()
+        return [{"id": row[0], "camera_type": row[1], "ip": row[2], "params": json.loads(row[3])} for row in rows]
+
+    def prune(self):
+        """Delete the oldest finished jobs, and any listing or downloaded files left behind by finished jobs"""
+        with self.lock, self.db:
+            self.db.execute("""DELETE FROM jobs WHERE status != 'running' AND id NOT IN (
+                                   SELECT id FROM jobs WHERE status != 'running' ORDER BY id DESC LIMIT ?)""",
+                            (MAX_FINISHED_JOBS,))
+            self.db.execute("DELETE FROM listing WHERE job_id NOT IN (SELECT id FROM jobs WHERE status = 'running')")
+            self.db.execute("DELETE FROM committed WHERE job_id NOT IN (SELECT id FROM jobs WHERE status = 'running')")
+
+
+class JobJournal:
+    """Journal of a single job, used by the download scripts"""
+
+    def __init__(self, path, job_id):
+        """
+        Args:
+            path (str): path to the journal database
+            job_id (int): id of the job created by the web app
+        """
+        self.job_id = job_id
+        self.db = connect(str(path))
+        row = self.db.execute("SELECT created, listing_complete FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"job {job_id} not found in journal")
+        self.created, self.listing_complete = row[0], bool(row[1])
+
+        # downloaded files waiting to be written to the journal
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_checkpoint = time.monotonic()
+
+    def record_listing(self, files):
+        """Add (url, dest_path) pairs listed on the camera to the job's listing snapshot"""
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR IGNORE INTO listing (job_id, dest_path, url) VALUES (?, ?, ?)",
+                                [(self.job_id, dest_path, url) for url, dest_path in files])
+
+    def mark_listing_complete(self):
+        """Record that every file on the camera has been listed, so a resumed job can use the snapshot"""
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET listing_complete = 1, updated = ? WHERE id = ?", (time.time(), self.job_id))
+        self.listing_complete = True
+
+    def get_listing(self):
+        """Get the job's listing snapshot as a list of (url, dest_path) pairs"""
+        with self.lock:
+            rows = self.db.execute("SELECT url, dest_path FROM listing WHERE job_id = ? ORDER BY dest_path",
+                                   (self.job_id,)).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def committed_paths(self, catalog=None):
+        """
+        Get the files which have already been downloaded by this job.  Includes files written after the
+        last checkpoint, detected because they were downloaded after the job was created
+
+        Args:
+            catalog (Catalog): catalog of downloaded files, optional.  Files hardlinked to an earlier download keep
+                its modification time, so the time they were added to the catalog is used instead
+
+        Returns:
+            set: destination paths
+        """
+        with self.lock:
+            committed = {row[0] for row in self.db.execute("SELECT dest_path FROM committed WHERE job_id = ?", (self.job_id,))}
+            listed = [row[0] for row in self.db.execute("SELECT dest_path FROM listing WHERE job_id = ?", (self.job_id,))]
+        for dest_path in listed:
+            if dest_path in committed or not os.path.exists(dest_path):
+                continue
+            downloaded = catalog.get_added(dest_path) if catalog is not None else None
+            if downloaded is None:
+                downloaded = os.path.getmtime(dest_path)
+            if downloaded >= self.created:
+                committed.add(dest_path)
+        return committed
+
+    def commit(self, dest_path):
+        """Record that a file has been downloaded.  Written to the journal in batches"""
+        with self.lock:
+            self.pending.append(dest_path)
+            due = len(self.pending) >= CHECKPOINT_BATCH or time.monotonic() - self.last_checkpoint >= CHECKPOINT_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write downloaded files waiting in the batch to the journal"""
+        with self.lock:
+            if self.pending:
+                with self.db:
+                    self.db.executemany("INSERT OR IGNORE INTO committed (job_id, dest_path) VALUES (?, ?)",
+                                        [(self.job_id, dest_path) for dest_path in self.pending])
+                self.pending = []
+            self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        """Write any remaining downloaded files and close the journal"""
+        self.flush()
+        self.db.close()
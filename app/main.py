@@ -6,12 +6,18 @@
 # - Ping camera
 # - Download images and videos from camera
 # - Count files in the downloads directory
-# - Delete all files in the downloads directory
+# - Delete all files in the downloads directory, or only those matching a filter
+# - Limit disk space used by downloaded files, deleting the oldest files first
+# - Automatically download new files when a camera comes online (optional)
+# - Resume downloads interrupted by a restart
 
+import atexit
 import logging.handlers
+import queue
 import subprocess
 import asyncio
 import sys
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from fastapi import FastAPI
@@ -19,29 +25,78 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Dict, Any
 
-# Import the settings module
+# Import the settings, auto sync and storage modules
 from app import settings
+from app.autosync import AutoSync, probe_camera
+from app.storage import StorageManager, make_filter
+from app.events import EventStream
+from app.journal import Journal
 
 # Define the downloads directory path
 DOWNLOADS_DIR = Path("/app/downloads")
 
+# Journal of download jobs, used to resume downloads interrupted by a restart
+JOURNAL_FILE = Path("/app/settings/jobs.db")
+
+# Disk quota and minimum free space are checked this often (in seconds) while a download is running
+STORAGE_CHECK_INTERVAL = 30
+
+# Download jobs which produce no output for this many seconds are assumed to have stalled and are stopped.
+# The download scripts apply their own timeouts, report every retry and print the progress of large files
+# every 30 seconds, so this is only a last resort.  Partially downloaded files older than this are deleted
+DOWNLOAD_STALL_TIMEOUT = 300
+
 # Configure console logging
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(logging.DEBUG)
 console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 console_handler.setFormatter(console_formatter)
 
-# Create logger
+# Set up logging for the app
+log_dir = Path('/app/logs')
+log_dir.mkdir(parents=True, exist_ok=True)
+fh = logging.handlers.RotatingFileHandler(log_dir / 'lumber.log', maxBytes=2**16, backupCount=1)
+
+# Create logger.  Records are passed through a queue to a background thread
+# so console and file output never blocks the event loop
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, console_handler, fh, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("camera_downloader")
 logger.setLevel(logging.DEBUG)
-logger.addHandler(console_handler)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+# watch cameras with interrupted downloads and start the auto sync service (if enabled) when the app starts
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await resume_downloads()
+    if settings.get_auto_sync_enabled():
+        auto_sync.start()
+    yield
+    await auto_sync.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# progress of the download in progress for each camera, keyed by (type, ip).  Used to ensure manual
+# downloads and auto syncs never download from the same camera at the same time
+active_downloads: Dict[tuple, EventStream] = {}
+
+# references to running download jobs so they are not garbage collected
+download_tasks = set()
 
 # Ensure downloads directory exists
 DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
 logger.info(f"Downloads directory set up at {DOWNLOADS_DIR}")
 
+# storage manager enforces disk limits and deletes files in the background
+storage = StorageManager(DOWNLOADS_DIR)
+
+# job journal records the progress of each download
+journal = Journal(JOURNAL_FILE)
+
 
 # Helper function to check if camera is reachable
 def is_camera_reachable(ip: str) -> tuple[bool, str]:
@@ -60,7 +115,8 @@ def is_camera_reachable(ip: str) -> tuple[bool, str]:
             ["ping", "-c", "3", "-W", "2", ip],
             capture_output=True,
             text=True,
-            check=False
+            check=False,
+            timeout=15
         )
 
         if result.returncode == 0:
@@ -107,7 +163,13 @@ async def get_camera_settings() -> Dict[str, Any]:
             "cameras": {
                 "siyi": {"ip": siyi_ip},
                 "xfrobot": {"ip": xfrobot_ip}
-            }
+            },
+            "auto_sync": {
+                "enabled": settings.get_auto_sync_enabled(),
+                "running": auto_sync.running
+            },
+            "group_by_camera": settings.get_group_by_camera(),
+            "storage": settings.get_storage_limits()
         }
     except Exception as e:
         logger.exception(f"Error getting camera settings: {str(e)}")
@@ -127,45 +189,155 @@ async def ping_camera(ip: str) -> Dict[str, Any]:
 @app.post("/camera/download")
 async def download_images(type: str, ip: str, download_images: bool = True, download_videos: bool = True):
     """Download images from camera based on type and IP address"""
+    # Save the camera settings when a download is requested
+    settings.update_camera_ip(type, ip)
+
     return StreamingResponse(
         download_generator(type, ip, download_images, download_videos),
         media_type="text/event-stream"
     )
 
 
+# start a download job, or return the progress of the job already running for this camera
+def start_download(type: str, ip: str, download_images: bool = True, download_videos: bool = True,
+                   incremental: bool = False, job_id: int = None) -> tuple[EventStream, bool]:
+    """Start a download job in the background
+
+    Args:
+        job_id: id of an interrupted job to resume, None to start a new job
+
+    Returns:
+        Tuple of (event stream with the job's progress, True if a new job was started)
+    """
+    camera = (type, ip)
+    if camera in active_downloads:
+        return active_downloads[camera], False
+
+    stream = EventStream()
+    active_downloads[camera] = stream
+    task = asyncio.create_task(download_job(stream, job_id, type, ip, download_images, download_videos, incremental))
+    download_tasks.add(task)
+    task.add_done_callback(download_tasks.discard)
+    return stream, True
+
+
+# run a download job, publishing its progress to the event stream
+async def download_job(stream: EventStream, job_id: int, type: str, ip: str, download_images: bool,
+                       download_videos: bool, incremental: bool):
+    """Run a download to completion, regardless of whether anyone is listening
+
+    Args:
+        job_id: id of an interrupted job to resume, None to start a new job
+    """
+    try:
+        # deleting all files also deletes the catalog, which the download script would be using
+        if storage.deleting_all:
+            stream.publish("Error: all downloaded files are being deleted, please try again once the deletion has finished")
+            if job_id is not None:
+                auto_sync.watch_camera(type, ip, online=await probe_camera(type, ip))
+            return
+
+        # record the job so it can be resumed if interrupted
+        if job_id is None:
+            params = {"download_images": download_images, "download_videos": download_videos, "incremental": incremental}
+            job_id = await asyncio.to_thread(journal.create_job, type, ip, params)
+
+        async for message in run_download(job_id, type, ip, download_images, download_videos, incremental):
+            stream.publish(message)
+
+        # jobs which did not complete (camera not reachable, stalled or some files failed) are resumed when the
+        # camera next comes online.  Jobs cancelled by a shutdown never reach here and are resumed when the app restarts
+        if await asyncio.to_thread(journal.get_status, job_id) == "running":
+            stream.publish("Download will be resumed when the camera is next seen")
+            auto_sync.watch_camera(type, ip, online=await probe_camera(type, ip))
+        else:
+            auto_sync.forget_camera(type, ip)
+    finally:
+        del active_downloads[(type, ip)]
+        stream.close()
+
+
 # download image generator function for streaming progress to the frontend
 async def download_generator(type: str, ip: str, download_images: bool = True, download_videos: bool = True):
     """Generator function for streaming download progress"""
     logger.info(f"Download request received for {type} camera at {ip} (images: {download_images}, videos: {download_videos})")
 
-    # Save the camera settings when a download is requested
-    settings.update_camera_ip(type, ip)
+    # only one download may run for each camera at a time, so join the download already in progress
+    stream, started = start_download(type, ip, download_images, download_videos)
+    if not started:
+        logger.info(f"Download from {type} camera at {ip} already in progress, streaming its progress")
+        yield f"data: A download from the {type} camera at {ip} is already in progress, showing its progress\n\n"
+
+    # Stream progress in SSE format.  The download continues if the client disconnects
+    async for frame in stream.subscribe():
+        yield frame
+
+
+# watch cameras with downloads which were interrupted by a restart
+async def resume_downloads():
+    """Resume each unfinished job recorded in the journal when its camera is seen"""
+    for job in await asyncio.to_thread(journal.unfinished_jobs):
+        logger.info(f"Download job {job['id']} from {job['camera_type']} camera at {job['ip']} was interrupted, "
+                    "resuming it when the camera is seen")
+        auto_sync.watch_camera(job["camera_type"], job["ip"])
+
+
+# resume the interrupted download from a camera which has just come online
+async def resume_download(type: str, ip: str):
+    """Resume a camera's unfinished job, continuing from where it stopped"""
+    jobs = [job for job in await asyncio.to_thread(journal.unfinished_jobs) if (job["camera_type"], job["ip"]) == (type, ip)]
+    if not jobs:
+        auto_sync.forget_camera(type, ip)
+        return
+
+    # only the newest job is resumed
+    for job in jobs[:-1]:
+        await asyncio.to_thread(journal.finish_job, job["id"], "superseded")
+    job = jobs[-1]
+
+    logger.info(f"Resuming interrupted download job {job['id']} from {type} camera at {ip}")
+    stream, _ = start_download(type, ip, job_id=job["id"], **job["params"])
+    await stream.wait_closed()
+
 
-    # Correct SSE format with "data:" prefix and double newline
-    yield f"data: Connecting to camera at {ip}\n\n"
+# run the download script and yield its progress messages
+async def run_download(job_id: int, type: str, ip: str, download_images: bool, download_videos: bool,
+                       incremental: bool):
+    """Run the download script for the camera type, yielding progress messages"""
+    yield f"Connecting to camera at {ip}"
 
     try:
         # check if camera is reachable
-        is_reachable, message = is_camera_reachable(ip)
+        is_reachable, message = await asyncio.to_thread(is_camera_reachable, ip)
         if not is_reachable:
             logger.warning(f"Camera at {ip} is not reachable, aborting download")
-            yield f"data: Error: {message}. Please check the connection and try again\n\n"
+            yield f"Error: {message}. Please check the connection and try again"
             return
 
         # Set up download directory
         DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
+        # delete partial files left behind by download scripts which were stopped
+        await asyncio.to_thread(storage.remove_stale_partial_files, DOWNLOAD_STALL_TIMEOUT)
+
+        # make space for new files by deleting the oldest files if necessary
+        storage_limits = settings.get_storage_limits()
+        storage_message = await asyncio.to_thread(storage.enforce_limits, **storage_limits)
+        if storage_message:
+            yield storage_message
+
         # Get script path
         script_dir = Path(__file__).parent
         script_path = script_dir / f"{type}-download.py"
 
         if not script_path.exists():
             logger.error(f"Download script {script_path} not found")
-            yield f"data: Error: download script for {type} camera not found\n\n"
+            await asyncio.to_thread(journal.finish_job, job_id, "failed")
+            yield f"Error: download script for {type} camera not found"
             return
 
         # Build command with file type filters
-        cmd_parts = [f"python3 {script_path}", f"--ipaddr {ip}", f"--dest {DOWNLOADS_DIR}"]
+        cmd_parts = ["python3", str(script_path), "--ipaddr", ip, "--dest", str(DOWNLOADS_DIR)]
 
         # Add filter arguments based on selections
         if download_images and download_videos:
@@ -175,10 +347,23 @@ async def download_generator(type: str, ip: str, download_images: bool = True, d
         elif download_videos:
             cmd_parts.append("--videos")
         else:
-            yield f"data: Error: No file types selected for download\n\n"
+            await asyncio.to_thread(journal.finish_job, job_id, "failed")
+            yield f"Error: No file types selected for download"
             return
 
-        cmd = " ".join(cmd_parts)
+        # skip files which have already been downloaded
+        if incremental:
+            cmd_parts.append("--incremental")
+
+        # save files in a directory for each camera
+        if settings.get_group_by_camera():
+            cmd_parts.append("--group")
+
+        # script stops downloading if free space falls below the minimum
+        cmd_parts += ["--min-free-mb", str(storage_limits["min_free_mb"])]
+
+        # script records its progress in the job journal
+        cmd_parts += ["--journal", str(JOURNAL_FILE), "--job-id", str(job_id)]
 
         # display download started message
         file_types = []
@@ -188,70 +373,138 @@ async def download_generator(type: str, ip: str, download_images: bool = True, d
             file_types.append("videos")
         file_types_str = " and ".join(file_types)
 
-        yield f"data: Started downloading {file_types_str} from {type} camera at {ip}\n\n"
-        yield f"data: This may take a while depending on the number of files...\n\n"
-        yield f"data: Files will be saved to: {DOWNLOADS_DIR}\n\n"
+        yield f"Started downloading {file_types_str} from {type} camera at {ip}"
+        yield f"This may take a while depending on the number of files..."
+        yield f"Files will be saved to: {DOWNLOADS_DIR}"
 
-        # Execute command
-        process = await asyncio.create_subprocess_shell(
-            cmd,
+        # Execute command directly (not via a shell) so the script itself is stopped if it stalls
+        process = await asyncio.create_subprocess_exec(
+            *cmd_parts,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
 
-        # Set up heartbeat task
-        heartbeat_interval = 5  # seconds
-        last_message_time = asyncio.get_event_loop().time()
+        # output is polled so stalls are detected even if the script prints nothing
+        poll_interval = 5  # seconds
+        last_output_time = asyncio.get_event_loop().time()
+        stalled = False
+
+        # disk limits are checked in the background while the download runs
+        last_storage_check = last_output_time
+        storage_check = None
 
         # Process stdout in real-time
         while True:
+            # report the result of the last background disk limits check
+            if storage_check is not None and storage_check.done():
+                try:
+                    storage_message = storage_check.result()
+                except Exception as e:
+                    logger.exception(f"Error enforcing storage limits: {str(e)}")
+                    storage_message = f"Error enforcing storage limits: {str(e)}"
+                if storage_message:
+                    yield storage_message
+                storage_check = None
+
+            # delete the oldest files if the disk limits have been exceeded
+            current_time = asyncio.get_event_loop().time()
+            if current_time - last_storage_check >= STORAGE_CHECK_INTERVAL and storage_check is None:
+                storage_check = asyncio.create_task(asyncio.to_thread(storage.enforce_limits, **storage_limits))
+                last_storage_check = current_time
+
             try:
-                # set a timeout to send heartbeats if case no lines received
+                # set a timeout to check for stalls in case no lines received
                 line = await asyncio.wait_for(
                     process.stdout.readline(),
-                    timeout=heartbeat_interval
+                    timeout=poll_interval
                 )
 
                 # process incoming lines
                 if line:
                     line_text = line.decode('utf-8').rstrip()
                     logger.debug(f"Script output: {line_text}")
-                    yield f"data: {line_text}\n\n"
-                    last_message_time = asyncio.get_event_loop().time()
+                    yield line_text
+                    last_output_time = asyncio.get_event_loop().time()
                 else:
                     # end of output
                     break
 
             except asyncio.TimeoutError:
-                # send heartbeat
                 current_time = asyncio.get_event_loop().time()
-                if current_time - last_message_time >= heartbeat_interval:
-                    logger.debug("Sending heartbeat to keep connection alive")
-                    # Heartbeat in correct SSE format
-                    yield ":\n\n"
-                    last_message_time = current_time
 
                 # check if process is still running
                 if process.returncode is not None:
                     break
 
+                # stop the download script if it has stopped making progress
+                if current_time - last_output_time >= DOWNLOAD_STALL_TIMEOUT:
+                    logger.warning(f"Download script produced no output for {DOWNLOAD_STALL_TIMEOUT}s, stopping it")
+                    process.kill()
+                    stalled = True
+                    break
+
         # Wait for process to complete
         await process.wait()
 
         # Check result
-        if process.returncode == 0:
-            yield "data: Download completed successfully!\n\n"
+        if stalled:
+            yield f"Download failed: no progress from camera for {DOWNLOAD_STALL_TIMEOUT} seconds"
+        elif process.returncode == 0:
+            await asyncio.to_thread(journal.finish_job, job_id, "completed")
+            yield "Download completed successfully!"
         else:
             error = await process.stderr.read()
             error_text = error.decode('utf-8')
-            yield f"data: Download failed with Error: {error_text}\n\n"
+            yield f"Download failed with Error: {error_text}"
 
     except Exception as e:
         logger.exception(f"Error in download process: {str(e)}")
-        yield f"data: Error during download: {str(e)}\n\n"
+        yield f"Error during download: {str(e)}"
+
+
+# download new images and videos from a camera which has just come online
+async def auto_sync_download(type: str, ip: str):
+    """Run an incremental download in the background, logging progress"""
+    if (type, ip) in active_downloads:
+        logger.info(f"Auto sync skipped, download from {type} camera at {ip} already in progress")
+        return
+
+    logger.info(f"Auto sync started for {type} camera at {ip}")
+    stream, _ = start_download(type, ip, incremental=True)
+    await stream.wait_closed()
+    logger.info(f"Auto sync finished for {type} camera at {ip}")
 
-    # Final heartbeat before closing
-    yield ":\n\n"
+
+# background service which starts or resumes a download when a camera comes online
+auto_sync = AutoSync(auto_sync_download, resume_download)
+
+
+# enable or disable saving downloaded files in a directory for each camera
+@app.post("/camera/group-by-camera")
+async def set_group_by_camera(enabled: bool) -> Dict[str, Any]:
+    """Enable or disable grouping downloaded files by camera type and IP address"""
+    logger.info(f"Setting group by camera enabled={enabled}")
+    if not settings.update_group_by_camera(enabled):
+        return {"success": False, "message": "Failed to save group by camera setting"}
+
+    if enabled:
+        return {"success": True, "message": "New downloads will be grouped by camera"}
+    return {"success": True, "message": "New downloads will not be grouped by camera"}
+
+
+# enable or disable automatic download when a camera comes online
+@app.post("/camera/auto-sync")
+async def set_auto_sync(enabled: bool) -> Dict[str, Any]:
+    """Enable or disable automatic background sync"""
+    logger.info(f"Setting auto sync enabled={enabled}")
+    if not settings.update_auto_sync_enabled(enabled):
+        return {"success": False, "message": "Failed to save auto sync setting"}
+
+    if enabled:
+        auto_sync.start()
+        return {"success": True, "message": "Auto sync enabled"}
+    await auto_sync.stop()
+    return {"success": True, "message": "Auto sync disabled"}
 
 
 # Count image and video files in the downloads directory
@@ -268,21 +521,8 @@ async def count_files() -> Dict[str, Any]:
                 "videos": 0
             }
 
-        # Count files by extension
-        image_count = 0
-        video_count = 0
-
-        # Common image and video extensions
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
-        video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv']
-
-        for file in DOWNLOADS_DIR.iterdir():
-            if file.is_file():
-                lower_name = file.name.lower()
-                if any(lower_name.endswith(ext) for ext in image_extensions):
-                    image_count += 1
-                elif any(lower_name.endswith(ext) for ext in video_extensions):
-                    video_count += 1
+        # Count files by extension, in a thread as every directory is searched
+        image_count, video_count = await asyncio.to_thread(storage.count_files)
 
         return {
             "success": True,
@@ -302,48 +542,76 @@ async def count_files() -> Dict[str, Any]:
 # delete all files in the downloads directory
 @app.delete("/camera/delete-files")
 async def delete_files() -> Dict[str, Any]:
-    """Delete all files from the downloads directory"""
+    """Start deleting all files from the downloads directory in the background"""
     logger.info("Deleting files from downloads directory")
 
-    try:
-        if not DOWNLOADS_DIR.exists():
-            DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
-            return {
-                "success": True,
-                "message": "No files to delete",
-                "deleted_count": 0
-            }
+    # deleting the catalog while a download is adding to it would leave it incomplete
+    if active_downloads:
+        return {"success": False, "message": "Cannot delete all files while a download is in progress"}
 
-        # Count files before deletion
-        file_count = 0
-        for item in DOWNLOADS_DIR.iterdir():
-            if item.is_file():
-                file_count += 1
+    task = storage.start_delete("all files")
+    return {"success": True, "message": "Deleting all files", "task_id": task.id}
 
-        if file_count == 0:
-            return {
-                "success": True,
-                "message": "No files to delete",
-                "deleted_count": 0
-            }
 
-        # Delete all files (but keep the directory)
-        for item in DOWNLOADS_DIR.iterdir():
-            if item.is_file():
-                item.unlink()
+# delete files matching a filter from the downloads directory
+@app.post("/camera/delete-filtered")
+async def delete_filtered_files(media: str = "all", older_than_days: float = 0, path: str = "") -> Dict[str, Any]:
+    """Start deleting files matching a filter in the background
 
-        return {
-            "success": True,
-            "message": f"Successfully deleted {file_count} files",
-            "deleted_count": file_count
-        }
+    Args:
+        media: "images", "videos" or "all"
+        older_than_days: only delete files downloaded more than this many days ago, 0 for files of any age
+        path: only delete files within this directory (relative to the downloads directory), "" for all directories
+    """
+    if media not in ("all", "images", "videos"):
+        return {"success": False, "message": f"Invalid media type: {media}"}
+
+    description = {"all": "files", "images": "image files", "videos": "video files"}[media]
+    if older_than_days > 0:
+        description += f" older than {older_than_days:g} days"
+    if path:
+        description += f" in {path}"
+    logger.info(f"Deleting {description} from downloads directory")
+
+    task = storage.start_delete(description, make_filter(media, older_than_days, path))
+    return {"success": True, "message": f"Deleting {description}", "task_id": task.id}
+
+
+# get the progress of a background deletion
+@app.post("/camera/delete-status")
+async def delete_status(task_id: str) -> Dict[str, Any]:
+    """Get the progress of a background deletion started by delete-files or delete-filtered"""
+    task = storage.get_task(task_id)
+    if task is None:
+        return {"success": False, "message": f"Unknown task {task_id}"}
+    return {"success": True, **task.to_dict()}
+
+
+# get disk usage and limits
+@app.post("/camera/storage-status")
+async def storage_status() -> Dict[str, Any]:
+    """Get disk space used by downloaded files, free disk space and the storage limits"""
+    try:
+        status = await asyncio.to_thread(storage.status, **settings.get_storage_limits())
+        return {"success": True, **status}
     except Exception as e:
-        logger.exception(f"Error deleting files: {str(e)}")
-        return {
-            "success": False,
-            "message": f"Error: {str(e)}",
-            "deleted_count": 0
-        }
+        logger.exception(f"Error getting storage status: {str(e)}")
+        return {"success": False, "message": f"Error: {str(e)}"}
+
+
+# save storage limits
+@app.post("/camera/storage-settings")
+async def save_storage_settings(quota_mb: int, min_free_mb: int) -> Dict[str, Any]:
+    """Save the disk quota and minimum free disk space, deleting the oldest files if they are exceeded"""
+    logger.info(f"Saving storage limits: quota_mb={quota_mb}, min_free_mb={min_free_mb}")
+    if quota_mb < 0 or min_free_mb < 0:
+        return {"success": False, "message": "Storage limits cannot be negative"}
+    if not settings.update_storage_limits(quota_mb, min_free_mb):
+        return {"success": False, "message": "Failed to save storage limits"}
+
+    # apply the new limits in the background, progress is available from delete-status
+    task = storage.start_enforce_limits(quota_mb, min_free_mb)
+    return {"success": True, "message": "Storage limits saved", "task_id": task.id}
 
 
 # Mount static files AFTER defining API routes
@@ -351,12 +619,6 @@ async def delete_files() -> Dict[str, Any]:
 static_dir = Path(__file__).parent / "static"
 app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
 
-# Set up logging for the app
-log_dir = Path('/app/logs')
-log_dir.mkdir(parents=True, exist_ok=True)
-fh = logging.handlers.RotatingFileHandler(log_dir / 'lumber.log', maxBytes=2**16, backupCount=1)
-logger.addHandler(fh)
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
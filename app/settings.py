@@ -23,6 +23,14 @@ DEFAULT_SETTINGS = {
     'last_used': {
         'camera_type': 'siyi',
         'ip': '192.168.144.25'
+    },
+    'auto_sync': {
+        'enabled': False
+    },
+    'storage': {
+        'group_by_camera': False,
+        'quota_mb': 0,          # maximum size of downloaded files in MB, 0 for no limit
+        'min_free_mb': 0        # minimum free disk space in MB, 0 for no minimum
     }
 }
 
@@ -145,3 +153,120 @@ def get_last_used():
     """
     settings = get_settings()
     return settings.get('last_used', DEFAULT_SETTINGS['last_used'])
+
+
+# get whether files should be automatically downloaded when a camera comes online
+def get_auto_sync_enabled():
+    """
+    Get whether automatic background sync is enabled
+
+    Returns:
+        bool: True if enabled, False otherwise
+    """
+    settings = get_settings()
+    return settings.get('auto_sync', DEFAULT_SETTINGS['auto_sync']).get('enabled', False)
+
+
+# enable or disable automatic background sync
+def update_auto_sync_enabled(enabled):
+    """
+    Enable or disable automatic background sync
+
+    Args:
+        enabled (bool): True to enable, False to disable
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        settings = get_settings()
+        settings.setdefault('auto_sync', {})['enabled'] = enabled
+        save_settings(settings)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating auto sync setting: {e}")
+        return False
+
+
+# get whether downloaded files are saved in a directory for each camera
+def get_group_by_camera():
+    """
+    Get whether downloaded files are grouped in a directory for each camera type and IP address
+
+    Returns:
+        bool: True if files are grouped by camera, False otherwise
+    """
+    settings = get_settings()
+    return settings.get('storage', DEFAULT_SETTINGS['storage']).get('group_by_camera', False)
+
+
+# enable or disable grouping downloaded files by camera
+def update_group_by_camera(enabled):
+    """
+    Enable or disable grouping downloaded files in a directory for each camera
+
+    Args:
+        enabled (bool): True to group files by camera, False to save all cameras' files together
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        settings = get_settings()
+        settings.setdefault('storage', {})['group_by_camera'] = enabled
+        save_settings(settings)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating group by camera setting: {e}")
+        return False
+
+
+# get the storage quota and minimum free disk space
+def get_storage_limits():
+    """
+    Get the storage quota and minimum free disk space
+
+    Returns:
+        dict: Dictionary with quota_mb (0 for no limit) and min_free_mb
+    """
+    storage = get_settings().get('storage', {})
+    return {
+        'quota_mb': storage.get('quota_mb', DEFAULT_SETTINGS['storage']['quota_mb']),
+        'min_free_mb': storage.get('min_free_mb', DEFAULT_SETTINGS['storage']['min_free_mb'])
+    }
+
+
+# update the storage quota and minimum free disk space
+def update_storage_limits(quota_mb, min_free_mb):
+    """
+    Update the storage quota and minimum free disk space
+
+    Args:
+        quota_mb (int): maximum size of downloaded files in MB, 0 for no limit
+        min_free_mb (int): minimum free disk space in MB
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        settings = get_settings()
+        storage = settings.setdefault('storage', {})
+        storage['quota_mb'] = quota_mb
+        storage['min_free_mb'] = min_free_mb
+        save_settings(settings)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating storage limits: {e}")
+        return False
+
+
+# get the type and IP address of every configured camera
+def get_cameras():
+    """
+    Get the type and IP address of every camera in the settings file
+
+    Returns:
+        list: List of (camera_type, ip) tuples
+    """
+    settings = get_settings()
+    return [(camera_type, camera['ip']) for camera_type, camera in settings['cameras'].items() if 'ip' in camera]
@@ -11,12 +11,13 @@ AP_FLAKE8_CLEAN
 #
 
 import os
-import json
 from argparse import ArgumentParser
-from urllib.request import urlopen, urlretrieve
 from urllib.parse import urlencode
-from urllib.error import URLError, HTTPError
 from enum import Enum
+from requests import RequestException
+from download_utils import Downloader, local_path
+from catalog import Catalog
+from journal import JobJournal
 
 # prefix string for text output to user
 prefix_str = "siyi-download.py: "
@@ -50,8 +51,56 @@ def get_filelist_url(ip_address, media_type, dir_path):
     return f"http://{ip_address}:82/cgi-bin/media.cgi/api/v1/getmedialist?" + urlencode(params)
 
 
+# get list of directories on the camera for the given media type
+def get_dir_list(downloader, ip_address, media_type):
+    dir_dict = downloader.fetch_json(get_dirlist_url(ip_address, media_type))
+
+    # check that the request succeeded
+    if (not dir_dict['success']):
+        exit(prefix_str + "failed to get list of directories")
+
+    # check response includes 'data'
+    if ('data' not in dir_dict.keys()):
+        exit(prefix_str + "could not get list of directories, no 'data' in response")
+    dir_dict_data = dir_dict['data']
+
+    # check response includes 'directories'
+    if ('directories' not in dir_dict_data.keys()):
+        exit(prefix_str + "could not get list of directories, no 'directories' in response")
+    dir_dict_data_directories = dir_dict_data['directories']
+
+    # create list of directories from 'path' values
+    dir_list = []
+    for dir in dir_dict_data_directories:
+        if ('path' in dir.keys()):
+            dir_list.append(dir['path'])
+    return dir_list
+
+
+# get list of files in a directory on the camera
+def get_file_list(downloader, ip_address, media_type, dir_path):
+    filename_dict = downloader.fetch_json(get_filelist_url(ip_address, media_type, dir_path))
+
+    # check that the request succeeded
+    if (not filename_dict['success']):
+        exit(prefix_str + "failed to get list of files")
+
+    # check response includes 'data'
+    if ('data' not in filename_dict.keys()):
+        exit(prefix_str + "could not get list of files, no 'data' in response")
+    filename_dict_data = filename_dict['data']
+
+    # check response includes 'list'
+    if ('list' not in filename_dict_data.keys()):
+        exit(prefix_str + "could not get list of files, no 'list' in response")
+    return filename_dict_data['list']
+
+
 # download files from camera
-def download_files(ip_address, dest_dir, download_images=True, download_videos=True):
+# returns the list of files which could not be downloaded even after retrying
+# files are saved in the same directory structure as on the camera, optionally grouped by camera
+def download_files(ip_address, dest_dir, download_images=True, download_videos=True, incremental=False, group=False,
+                   min_free_mb=0, journal=None):
 
     # determine which media types to download based on flags
     media_types_to_download = []
@@ -63,78 +112,61 @@ def download_files(ip_address, dest_dir, download_images=True, download_videos=T
     # if nothing is selected, skip download
     if not media_types_to_download:
         print(prefix_str + "no file types selected for download")
-        return
-
-    # repeat for selected media types
+        return []
+
+    downloader = Downloader(prefix_str, skip_existing=incremental, catalog=Catalog(dest_dir),
+                            min_free_bytes=min_free_mb * 2**20, journal=journal)
+    group_by = ("siyi", ip_address) if group else (None, None)
+
+    # resume an interrupted job from its listing snapshot
+    resume_files = downloader.resume_listing()
+    if resume_files is not None:
+        downloader.log(f"resuming interrupted download of {len(resume_files)} files")
+        count = downloader.download_all(resume_files)
+        downloader.log(f"downloaded {count} file(s)")
+        return downloader.retry_failed()
+
+    # list files for all selected media types before downloading
+    files_by_type = {}
     for media_type in media_types_to_download:
 
         # display output to user
-        print(prefix_str + f"downloading {MEDIA_TYPE_STR[media_type]} files")
-
-        # download list of directories in JSON format
-        dir_list_url = get_dirlist_url(ip_address, media_type)
-        with urlopen(dir_list_url) as get_dir_url:
-            dir_dict = json.load(get_dir_url)
-
-            # check that the request succeeded
-            if (not dir_dict['success']):
-                exit(prefix_str + "failed to get list of directories")
-
-            # check response includes 'data'
-            if ('data' not in dir_dict.keys()):
-                exit(prefix_str + "could not get list of directories, no 'data' in response")
-            dir_dict_data = dir_dict['data']
-
-            # check response includes 'directories'
-            if ('directories' not in dir_dict_data.keys()):
-                exit(prefix_str + "could not get list of directories, no 'directories' in response")
-            dir_dict_data_directories = dir_dict_data['directories']
-
-            # create list of directories from 'path' values
-            dir_list = []
-            for dir in dir_dict_data_directories:
-                if ('path' in dir.keys()):
-                    dir_list.append(dir['path'])
-            print(prefix_str + f"{len(dir_list)} directories")
+        downloader.log(f"listing {MEDIA_TYPE_STR[media_type]} files")
+
+        try:
+            # download list of directories
+            dir_list = get_dir_list(downloader, ip_address, media_type)
+            downloader.log(f"{len(dir_list)} directories")
 
             # get list of files in each directory
+            files = []
             for dir_path in dir_list:
-                filenames_url = get_filelist_url(ip_address, media_type, dir_path)
-                with urlopen(filenames_url) as get_filenames_url:
-                    filename_dict = json.load(get_filenames_url)
-
-                    # check that the request succeeded
-                    if (not filename_dict['success']):
-                        exit(prefix_str + "failed to get list of files")
-
-                    # check response includes 'data'
-                    if ('data' not in filename_dict.keys()):
-                        exit(prefix_str + "could not get list of files, no 'data' in response")
-                    filename_dict_data = filename_dict['data']
-
-                    # check response includes 'list'
-                    if ('list' not in filename_dict_data.keys()):
-                        exit(prefix_str + "could not get list of files, no 'list' in response")
-                    filename_dict_data_list = filename_dict_data['list']
-                    print(prefix_str + f"{len(filename_dict_data_list)} files")
-
-                    # download each image
-                    for fileinfo in filename_dict_data_list:
-                        if ('name' not in fileinfo.keys() or 'url' not in fileinfo.keys()):
-                            exit(prefix_str + "could not get list of files, no 'name' or 'url' in response")
-                        filename = fileinfo['name']
-                        file_url = fileinfo['url']
-
-                        # correct incorrect ip address in returned url
-                        file_url_fixed = file_url.replace(ip_address_default, ip_address)
-
-                        # download file
-                        print(prefix_str + f"downloading {filename} from {file_url_fixed}")
-                        dest_filename = os.path.join(dest_dir, filename)
-                        try:
-                            urlretrieve(file_url_fixed, dest_filename)
-                        except (URLError, HTTPError) as e:
-                            print(prefix_str + f"failed to download {filename}: {e}")
+                file_list = get_file_list(downloader, ip_address, media_type, dir_path)
+                downloader.log(f"{len(file_list)} files")
+
+                for fileinfo in file_list:
+                    if ('name' not in fileinfo.keys() or 'url' not in fileinfo.keys()):
+                        exit(prefix_str + "could not get list of files, no 'name' or 'url' in response")
+                    filename = fileinfo['name']
+                    file_url = fileinfo['url']
+
+                    # correct incorrect ip address in returned url
+                    file_url_fixed = file_url.replace(ip_address_default, ip_address)
+                    files.append((file_url_fixed, local_path(dest_dir, dir_path, filename, *group_by)))
+        except (RequestException, ValueError) as e:
+            exit(prefix_str + f"failed to get list of {MEDIA_TYPE_STR[media_type]} files: {e}")
+        files_by_type[media_type] = files
+
+    # record the listing so the job can be resumed if interrupted
+    downloader.record_listing([file for files in files_by_type.values() for file in files])
+
+    # download files, failures are retried at the end of the job
+    for media_type, files in files_by_type.items():
+        downloader.log(f"downloading {MEDIA_TYPE_STR[media_type]} files")
+        count = downloader.download_all(files)
+        downloader.log(f"downloaded {count} {MEDIA_TYPE_STR[media_type]} file(s)")
+
+    return downloader.retry_failed()
 
 
 # main function
@@ -145,6 +177,14 @@ def main():
     parser.add_argument("--images", action="store_true", default=False, help="download image files")
     parser.add_argument("--videos", action="store_true", default=False, help="download video files")
     parser.add_argument("--all", action="store_true", default=False, help="download all file types")
+    parser.add_argument("--incremental", action="store_true", default=False,
+                        help="skip files which have already been downloaded")
+    parser.add_argument("--group", action="store_true", default=False,
+                        help="save files in a directory for each camera type and IP address")
+    parser.add_argument("--min-free-mb", type=int, default=0,
+                        help="stop downloading files when free disk space falls below this many MB")
+    parser.add_argument("--journal", default=None, help="job journal database, used to resume interrupted downloads")
+    parser.add_argument("--job-id", type=int, default=None, help="id of this download's job in the journal")
     args = parser.parse_args()
 
     # check destination directory exists
@@ -160,8 +200,16 @@ def main():
         download_images = True
         download_videos = True
 
+    # open job journal
+    journal = None
+    if args.journal and args.job_id is not None:
+        journal = JobJournal(args.journal, args.job_id)
+
     # download files
-    download_files(args.ipaddr, args.dest, download_images, download_videos)
+    failed = download_files(args.ipaddr, args.dest, download_images, download_videos, args.incremental, args.group,
+                            args.min_free_mb, journal)
+    if failed:
+        exit(prefix_str + f"{len(failed)} file(s) could not be downloaded")
 
 
 # main
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+# Storage manager for the downloads directory
+# - Disk quota and minimum free disk space, enforced by deleting the oldest downloaded files first
+# - Selective deletion of files matching a filter (media type, age and directory)
+# - Deletions run in a background thread pool and report their progress
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.catalog import Catalog, CATALOG_DIRNAME, LINK_SUFFIX
+from app.download_utils import PARTIAL_SUFFIX
+
+logger = logging.getLogger("camera_downloader.storage")
+
+# Common image and video extensions
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv']
+
+MB = 2**20
+
+# number of finished delete tasks whose progress is kept
+MAX_FINISHED_TASKS = 20
+
+
+# create a filter function for selecting downloaded files
+def make_filter(media: str = "all", older_than_days: float = 0, path: str = ""):
+    """Create a filter which selects downloaded files
+
+    Args:
+        media: "images", "videos" or "all"
+        older_than_days: only select files downloaded more than this many days ago, 0 to select files of any age
+        path: only select files within this directory (relative to the downloads directory), "" for all directories
+
+    Returns:
+        Function which is called with (file, relative_path) and returns True if the file is selected
+    """
+    if media == "images":
+        extensions = IMAGE_EXTENSIONS
+    elif media == "videos":
+        extensions = VIDEO_EXTENSIONS
+    else:
+        extensions = None
+    cutoff = time.time() - older_than_days * 86400 if older_than_days > 0 else None
+    prefix = path.strip("/")
+
+    def selected(file: Path, relative_path: str) -> bool:
+        if extensions is not None and not any(file.name.lower().endswith(ext) for ext in extensions):
+            return False
+        if prefix and not (relative_path == prefix or relative_path.startswith(prefix + "/")):
+            return False
+        if cutoff is not None and file.stat().st_mtime > cutoff:
+            return False
+        return True
+
+    return selected
+
+
+class DeleteTask:
+    """Progress of a background deletion"""
+
+    def __init__(self, description: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.description = description
+        self.status = "running"
+        self.total = 0
+        self.deleted = 0
+        self.freed_bytes = 0
+        self.message = ""
+
+    def to_dict(self) -> dict:
+        """Get the task's progress in a form which can be returned to the frontend"""
+        return {
+            "task_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "total": self.total,
+            "deleted": self.deleted,
+            "freed_mb": round(self.freed_bytes / MB, 1),
+            "message": self.message
+        }
+
+
+class StorageManager:
+    """Manages disk space used by the downloads directory"""
+
+    def __init__(self, downloads_dir: Path, max_workers: int = 2):
+        self.downloads_dir = Path(downloads_dir)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self.tasks = {}
+        self.enforce_lock = threading.Lock()
+        self.delete_all_task = None
+
+    def iter_files(self):
+        """Yield the path of every downloaded file, skipping the catalog and files still being written"""
+        for file in self.downloads_dir.rglob("*"):
+            if CATALOG_DIRNAME in file.relative_to(self.downloads_dir).parts:
+                continue
+            if file.is_file() and not file.name.endswith((PARTIAL_SUFFIX, LINK_SUFFIX)):
+                yield file
+
+    def count_files(self) -> tuple[int, int]:
+        """Count downloaded image and video files
+
+        Returns:
+            Tuple of (number of image files, number of video files)
+        """
+        image_count = 0
+        video_count = 0
+        for file in self.iter_files():
+            lower_name = file.name.lower()
+            if any(lower_name.endswith(ext) for ext in IMAGE_EXTENSIONS):
+                image_count += 1
+            elif any(lower_name.endswith(ext) for ext in VIDEO_EXTENSIONS):
+                video_count += 1
+        return image_count, video_count
+
+    def remove_stale_partial_files(self, max_age: float) -> int:
+        """Delete partially downloaded files left behind by download scripts which were stopped.
+        Files written to within max_age seconds may belong to a download in progress and are kept
+
+        Returns:
+            Number of files deleted
+        """
+        cutoff = time.time() - max_age
+        deleted = 0
+        for file in self.downloads_dir.rglob("*" + PARTIAL_SUFFIX):
+            try:
+                if file.is_file() and file.stat().st_mtime < cutoff:
+                    file.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                continue
+        if deleted:
+            logger.info(f"Deleted {deleted} partially downloaded files")
+        return deleted
+
+    def usage_bytes(self) -> int:
+        """Get the disk space used by downloaded files.  Hardlinked files are only counted once"""
+        seen = set()
+        total = 0
+        for file in self.iter_files():
+            try:
+                st = file.lstat()
+            except FileNotFoundError:
+                continue
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_size
+        return total
+
+    def status(self, quota_mb: int, min_free_mb: int) -> dict:
+        """Get disk usage and limits in MB"""
+        disk = shutil.disk_usage(self.downloads_dir)
+        return {
+            "used_mb": round(self.usage_bytes() / MB, 1),
+            "free_mb": round(disk.free / MB, 1),
+            "total_mb": round(disk.total / MB, 1),
+            "quota_mb": quota_mb,
+            "min_free_mb": min_free_mb
+        }
+
+    def enforce_limits(self, quota_mb: int, min_free_mb: int, task: DeleteTask = None) -> str:
+        """Delete the oldest downloaded files until usage is within the quota and the minimum free space is available.
+        Nothing is deleted if deleting every downloaded file would not be enough to meet the limits
+
+        Args:
+            quota_mb: maximum disk space used by downloaded files in MB, 0 for no limit
+            min_free_mb: minimum free disk space in MB, 0 for no minimum
+            task: task whose progress is updated as files are deleted, optional
+
+        Returns:
+            Message describing the files deleted, "" if the limits were not exceeded
+        """
+        with self.enforce_lock:
+            # forget files deleted outside the app
+            catalog = Catalog(self.downloads_dir)
+            try:
+                catalog.prune()
+
+                usage = self.usage_bytes()
+                excess = 0
+                if quota_mb > 0:
+                    excess = usage - quota_mb * MB
+                if min_free_mb > 0:
+                    excess = max(excess, min_free_mb * MB - shutil.disk_usage(self.downloads_dir).free)
+                if excess <= 0:
+                    return ""
+                if excess > usage:
+                    message = (f"Not deleting any files, deleting all {usage / MB:.1f} MB of downloaded files "
+                               f"would not free the {excess / MB:.1f} MB required to meet the storage limits")
+                    logger.warning(message)
+                    return message
+
+                files = self.oldest_files(excess)
+                if task is not None:
+                    task.total = len(files)
+                deleted = 0
+                freed = 0
+                for file in files:
+                    freed += catalog.remove(str(file))
+                    deleted += 1
+                    if task is not None:
+                        task.deleted = deleted
+                        task.freed_bytes = freed
+            finally:
+                catalog.close()
+            self.remove_empty_dirs()
+            message = f"Deleted {deleted} oldest files to free {freed / MB:.1f} MB of disk space"
+            logger.info(message)
+            return message
+
+    def oldest_files(self, excess: int) -> list:
+        """Get the oldest downloaded files which must be deleted to free excess bytes.
+        Hardlinked files only free disk space once all of their links are deleted"""
+        # files deleted while the list is being made (e.g. by a download replacing a duplicate) are skipped
+        candidates = []
+        for file in self.iter_files():
+            try:
+                candidates.append((file.lstat(), file))
+            except FileNotFoundError:
+                continue
+        candidates.sort(key=lambda candidate: candidate[0].st_mtime)
+
+        files = []
+        freed = 0
+        links = {}
+        for st, file in candidates:
+            if freed >= excess:
+                break
+            inode = (st.st_dev, st.st_ino)
+            links[inode] = links.get(inode, 0) + 1
+            if links[inode] >= st.st_nlink:
+                freed += st.st_size
+            files.append(file)
+        return files
+
+    def add_task(self, task: DeleteTask):
+        """Record a background task so its progress can be checked, forgetting the oldest finished tasks"""
+        self.tasks[task.id] = task
+        finished = [task_id for task_id, t in self.tasks.items() if t.status != "running"]
+        for task_id in finished[:-MAX_FINISHED_TASKS]:
+            del self.tasks[task_id]
+
+    def start_delete(self, description: str, selected=None) -> DeleteTask:
+        """Start deleting files in the background
+
+        Args:
+            description: description of the files being deleted, displayed to the user
+            selected: filter function created by make_filter, None to delete all files and the catalog
+
+        Returns:
+            The task, whose progress is updated as files are deleted
+        """
+        task = DeleteTask(description)
+        self.add_task(task)
+        if selected is None:
+            self.delete_all_task = task
+        self.executor.submit(self.run_delete, task, selected)
+        return task
+
+    @property
+    def deleting_all(self) -> bool:
+        """True while all files and the catalog are being deleted, downloads must not start until it finishes"""
+        return self.delete_all_task is not None and self.delete_all_task.status == "running"
+
+    def start_enforce_limits(self, quota_mb: int, min_free_mb: int) -> DeleteTask:
+        """Start enforcing the storage limits in the background
+
+        Returns:
+            The task, whose progress is updated as files are deleted
+        """
+        task = DeleteTask("oldest files to meet the storage limits")
+        self.add_task(task)
+        self.executor.submit(self.run_enforce_limits, task, quota_mb, min_free_mb)
+        return task
+
+    def get_task(self, task_id: str):
+        """Get a delete task by id, or None if not found"""
+        return self.tasks.get(task_id)
+
+    def run_delete(self, task: DeleteTask, selected):
+        """Delete files, updating the task's progress.  Runs in the thread pool"""
+        logger.info(f"Deleting {task.description}")
+        try:
+            files = []
+            for file in self.iter_files():
+                relative_path = file.relative_to(self.downloads_dir).as_posix()
+                if selected is None or selected(file, relative_path):
+                    files.append(file)
+            task.total = len(files)
+
+            if selected is None:
+                # deleting everything, the catalog is deleted afterwards so nothing needs to be remembered
+                usage_before = self.usage_bytes()
+                for file in files:
+                    file.unlink()
+                    task.deleted += 1
+                shutil.rmtree(self.downloads_dir / CATALOG_DIRNAME, ignore_errors=True)
+                task.freed_bytes = max(0, usage_before - self.usage_bytes())
+            else:
+                catalog = Catalog(self.downloads_dir)
+                try:
+                    for file in files:
+                        task.freed_bytes += catalog.remove(str(file))
+                        task.deleted += 1
+                finally:
+                    catalog.close()
+
+            self.remove_empty_dirs()
+            task.status = "done"
+            task.message = f"Deleted {task.deleted} files"
+            logger.info(f"Deleted {task.deleted} files ({task.description})")
+        except Exception as e:
+            logger.exception(f"Error deleting files: {str(e)}")
+            task.status = "failed"
+            task.message = f"Error: {str(e)}"
+
+    def run_enforce_limits(self, task: DeleteTask, quota_mb: int, min_free_mb: int):
+        """Enforce the storage limits, updating the task's progress.  Runs in the thread pool"""
+        try:
+            task.message = self.enforce_limits(quota_mb, min_free_mb, task) or "Storage limits are not exceeded"
+            task.status = "done"
+        except Exception as e:
+            logger.exception(f"Error enforcing storage limits: {str(e)}")
+            task.status = "failed"
+            task.message = f"Error: {str(e)}"
+
+    def remove_empty_dirs(self):
+        """Remove empty directories left behind after files are deleted (but keep the downloads directory)"""
+        for dirpath, dirnames, filenames in os.walk(self.downloads_dir, topdown=False):
+            path = Path(dirpath)
+            if path == self.downloads_dir or CATALOG_DIRNAME in path.relative_to(self.downloads_dir).parts:
+                continue
+            try:
+                path.rmdir()
+            except OSError:
+                pass
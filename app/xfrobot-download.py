@@ -7,9 +7,10 @@ Downloads image and video files from an XFRobot camera connected via ethernet
 import os
 import re
 from argparse import ArgumentParser
-from urllib.request import urlretrieve, urlopen
-from urllib.error import URLError, HTTPError
 from html.parser import HTMLParser
+from download_utils import Downloader, local_path
+from catalog import Catalog
+from journal import JobJournal
 
 # prefix string for output
 prefix_str = "xfrobot-download.py: "
@@ -33,33 +34,26 @@ class LinkExtractor(HTMLParser):
                 if attr[0] == 'href':
                     self.links.append(attr[1])
 
-# extract file links from HTML page
-def extract_file_links(base_url):
+# extract file links from HTML page, returns None if the page could not be fetched
+def extract_file_links(downloader, base_url):
     try:
-        with urlopen(base_url) as response:
-            html = response.read().decode('utf-8')
-            parser = LinkExtractor()
-            parser.feed(html)
-            return [link for link in parser.links if re.search(r'\.(jpg|jpeg|png|mp4|mov)$', link, re.IGNORECASE)]
+        html = downloader.fetch_text(base_url)
+        parser = LinkExtractor()
+        parser.feed(html)
+        return [link for link in parser.links if re.search(r'\.(jpg|jpeg|png|mp4|mov)$', link, re.IGNORECASE)]
     except Exception as e:
         print(prefix_str + f"Failed to fetch or parse URL {base_url}: {e}")
-        return []
+        return None
 
-# download files from the given list of links
-# returns the number of successfully downloaded files
-def download_files(base_url, links, dest_dir):
-    count = 0
+# get the list of (url, dest_path) pairs for the given list of links
+# files are saved in the camera's media directory (e.g. IMG), optionally within a directory for the camera
+def get_files(base_url, links, dest_dir, subdir, group_by):
+    files = []
     for link in links:
         filename = os.path.basename(link)
         full_url = link if link.startswith("http") else base_url + filename
-        dest_path = os.path.join(dest_dir, filename)
-        print(prefix_str + f"Downloading {filename} from {full_url}")
-        try:
-            urlretrieve(full_url, dest_path)
-            count += 1
-        except (URLError, HTTPError) as e:
-            print(prefix_str + f"Failed to download {filename}: {e}")
-    return count
+        files.append((full_url, local_path(dest_dir, subdir, filename, *group_by)))
+    return files
 
 # main function
 def main():
@@ -69,6 +63,14 @@ def main():
     parser.add_argument("--images", action="store_true", default=False, help="download image files")
     parser.add_argument("--videos", action="store_true", default=False, help="download video files")
     parser.add_argument("--all", action="store_true", default=False, help="download all file types")
+    parser.add_argument("--incremental", action="store_true", default=False,
+                        help="skip files which have already been downloaded")
+    parser.add_argument("--group", action="store_true", default=False,
+                        help="save files in a directory for each camera type and IP address")
+    parser.add_argument("--min-free-mb", type=int, default=0,
+                        help="stop downloading files when free disk space falls below this many MB")
+    parser.add_argument("--journal", default=None, help="job journal database, used to resume interrupted downloads")
+    parser.add_argument("--job-id", type=int, default=None, help="id of this download's job in the journal")
     args = parser.parse_args()
 
     if not os.path.exists(args.dest):
@@ -95,12 +97,42 @@ def main():
         print(prefix_str + "no file types selected for download")
         return
 
-    for media_type, subdir in media_types_to_download.items():
-        print(prefix_str + f"Fetching {media_type} files")
-        base_url = f"http://{args.ipaddr}/static/{subdir}/"
-        links = extract_file_links(base_url)
-        count = download_files(base_url, links, args.dest)
-        print(prefix_str + f"Downloaded {count} {media_type} file(s)")
+    # open job journal
+    journal = None
+    if args.journal and args.job_id is not None:
+        journal = JobJournal(args.journal, args.job_id)
+
+    downloader = Downloader(prefix_str, skip_existing=args.incremental, catalog=Catalog(args.dest),
+                            min_free_bytes=args.min_free_mb * 2**20, journal=journal)
+    group_by = ("xfrobot", args.ipaddr) if args.group else (None, None)
+
+    # resume an interrupted job from its listing snapshot, otherwise list files for all media types
+    resume_files = downloader.resume_listing()
+    if resume_files is not None:
+        downloader.log(f"Resuming interrupted download of {len(resume_files)} files")
+        files_by_type = {"resumed": resume_files}
+    else:
+        files_by_type = {}
+        for media_type, subdir in media_types_to_download.items():
+            downloader.log(f"Fetching {media_type} files")
+            base_url = f"http://{args.ipaddr}/static/{subdir}/"
+            links = extract_file_links(downloader, base_url)
+            if links is None:
+                # the job is not recorded as complete so it can be resumed once the camera responds
+                exit(prefix_str + f"failed to get list of {media_type} files")
+            files_by_type[media_type] = get_files(base_url, links, args.dest, subdir, group_by)
+
+        # record the listing so the job can be resumed if interrupted
+        downloader.record_listing([file for files in files_by_type.values() for file in files])
+
+    for media_type, files in files_by_type.items():
+        count = downloader.download_all(files)
+        downloader.log(f"Downloaded {count} {media_type} file(s)")
+
+    # retry any failed files at the end of the job
+    failed = downloader.retry_failed()
+    if failed:
+        exit(prefix_str + f"{len(failed)} file(s) could not be downloaded")
 
 if __name__ == "__main__":
     main()